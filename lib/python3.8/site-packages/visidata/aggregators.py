@@ -1,23 +1,90 @@
 import math
 import functools
 import collections
+import concurrent.futures
+import itertools
+import os
+import statistics
+import threading
 
-from visidata import Progress, isNullFunc, Column
+from visidata import Progress, isNullFunc, isNumeric, Column
 from visidata import *
+from visidata.aggregators_swar import swarAggregate
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+if np is not None and njit is not None:
+    @njit(cache=True)
+    def _percentile_nb(a, percent):
+        'JIT percentile interpolation over a sorted contiguous float64/int64 array.'
+        k = (a.size-1) * percent
+        f = math.floor(k)
+        c = math.ceil(k)
+        if f == c:
+            return 1.0*a[int(k)]
+        return a[int(f)]*(c-k) + a[int(c)]*(k-f)
+
+    @njit(cache=True)
+    def _median_nb(a):
+        'JIT middle-element selection via np.partition (avoids np.median, which averages the two middles).'
+        k = a.size//2
+        return 1.0*np.partition(a, k)[k]
+else:
+    _percentile_nb = None
+    _median_nb = None
+
+
+_PROGRESS_CHUNK = 4096  # rows per Progress update in hot loops
 
 @Column.api
 def getValueRows(self, rows):
     'Generate (val, row) for the given `rows` at this Column, excluding errors and nulls.'
     f = isNullFunc()
+    nulls = getattr(f, 'nulls', None)
+    trivial = nulls is not None and self.type in (int, float, str, currency, date, vlen)
 
-    for r in Progress(rows, 'calculating'):
-        try:
-            v = self.getTypedValue(r)
-            if not f(v):
-                yield v, r
-        except Exception:
-            pass
+    # advance Progress once per chunk instead of once per row; the UI samples
+    # progress far less often than the loop iterates
+    with Progress(gerund='calculating', total=len(rows)) as prog:
+        it = iter(rows)
+        while True:
+            chunk = list(itertools.islice(it, _PROGRESS_CHUNK))
+            if not chunk:
+                break
+            prog.addProgress(len(chunk))
+
+            if trivial:
+                # getTypedValue wraps its own errors, and these types produce hashable
+                # values, so this loop can skip the per-row exception handler entirely
+                for r in chunk:
+                    v = self.getTypedValue(r)
+                    if v not in nulls and not isinstance(v, TypedWrapper):
+                        yield v, r
+            elif nulls is not None:
+                # inline the null test: saves one Python-level call per row
+                for r in chunk:
+                    try:
+                        v = self.getTypedValue(r)
+                        if v not in nulls and not isinstance(v, TypedWrapper):
+                            yield v, r
+                    except Exception:
+                        pass
+            else:
+                for r in chunk:
+                    try:
+                        v = self.getTypedValue(r)
+                        if not f(v):
+                            yield v, r
+                    except Exception:
+                        pass
 
 @Column.api
 def getValues(self, rows):
@@ -25,17 +92,145 @@ def getValues(self, rows):
         yield v
 
 
+@Column.api
+def getNumpyValues(self, rows, dtype=None):
+    'Return typed values for `rows` as an ndarray (nulls and errors as NaN in float arrays), or None if numpy is unavailable or the values do not fit a numeric array.  Without an explicit dtype, int columns try uint16/int32/int64 (only possible when null-free) before float64; float columns materialize as float32 to halve memory bandwidth; other numeric types use float64.'
+    if np is None or not isNumeric(self) or self.type is date:
+        # dates float-convert to epoch seconds, which do not round-trip back
+        # through the column type; dates must aggregate as date values
+        return None
+
+    f = isNullFunc()
+    nan = float('nan')
+    def _vals():
+        for r in rows:
+            v = self.getTypedValue(r)
+            yield nan if f(v) else v
+
+    if dtype is not None:
+        candidates = [dtype]
+    elif self.type in (int, vlen):
+        # nulls yield NaN, which int dtypes reject, falling through to float64;
+        # uint16 first so flag/small-id columns can reach the SWAR kernels
+        candidates = [np.uint16, np.int32, np.int64, np.float64]
+    elif self.type is float:
+        candidates = [np.float32, np.float64]
+    else:
+        # currency values can exceed float32's 24-bit mantissa; keep full
+        # float64 precision so formatted cents stay exact
+        candidates = [np.float64]
+
+    for dt in candidates:
+        try:
+            with np.errstate(over='ignore'):  # float32 overflow is handled below, not warned to stderr
+                arr = np.fromiter(_vals(), dtype=dt, count=len(rows))
+        except (TypeError, ValueError, OverflowError):  # nulls, overflow, or non-coercible values (e.g. date)
+            continue
+        if dtype is None and dt is np.float32 and np.isinf(arr).any():
+            continue  # values beyond float32 range cast to inf silently; use float64
+        return arr
+    return None
+
+
+_SORTED_CACHE_SIZE = 8  # max cached sorted columns; eviction frees the sorted array
+
+_sortedValuesCache = collections.OrderedDict()  # [(id(col), id(rows), nrows)] -> (rows, sorted ndarray or list)
+_sortedCacheLock = threading.Lock()  # run_aggregates pool threads and the main thread share the cache
+
+def _clearSortedValuesCache():
+    with _sortedCacheLock:
+        _sortedValuesCache.clear()
+
+# cell edits change values without changing any cache key component, so drop
+# the cache between command inputs like the other Extensible caches
+Extensible._cache_clearers.append(_clearSortedValuesCache)
+
+@Column.api
+def _sortedValues(self, rows):
+    'Return sorted non-null typed values for `rows` (ndarray if numeric), memoized so stacked percentile/median aggregators share one sort.'
+    k = (id(self), id(rows), len(rows))
+    with _sortedCacheLock:
+        entry = _sortedValuesCache.get(k)
+        # entry holds a strong reference to its rows, both to keep the id from
+        # being recycled by a new list and to verify the hit is really ours
+        if entry is not None and entry[0] is rows:
+            _sortedValuesCache.move_to_end(k)
+            return entry[1]
+
+    # sort outside the lock so other columns' pool jobs proceed in parallel;
+    # concurrent misses on the same key just compute twice, harmlessly
+    arr = self.getNumpyValues(rows)
+    if arr is not None:
+        if arr.dtype.kind == 'f':
+            arr = arr[~np.isnan(arr)]
+        vals = np.sort(arr)
+    else:
+        vals = sorted(self.getValues(rows))
+    with _sortedCacheLock:
+        _sortedValuesCache[k] = (rows, vals)
+        if len(_sortedValuesCache) > _SORTED_CACHE_SIZE:
+            _sortedValuesCache.popitem(last=False)  # evict least-recently-used entry
+    return vals
+
+
 aggregators = collections.OrderedDict()  # [aggname] -> annotated func, or list of same
 
+# [aggname] -> numpy reduction over an ndarray of non-null values
+_npAggrFuncs = {}
+if np:
+    # sum/mean accumulate in float64 even over float32/int32 input, so
+    # narrowing the value stream costs bandwidth only, not precision
+    _npAggrFuncs = {
+        'sum': lambda a: np.nansum(a, dtype=np.float64),
+        'min': np.nanmin,
+        'max': np.nanmax,
+        'avg': lambda a: np.nanmean(a, dtype=np.float64),
+        'mean': lambda a: np.nanmean(a, dtype=np.float64),
+        'count': lambda a: int(a.size),  # NaNs are stripped before dispatch, so size == number of non-null values
+    }
+
 def _defaggr(name, type, func):
     'Define aggregator `name` that calls func(col, rows)'
     func.type=type
     func.__name__ = name
     return func
 
-def aggregator(name, func, *args, type=None):
-    'Define simple aggregator `name` that calls func(values)'
+class _CountingIterator:
+    'Iterate wrapped iterable, counting the values consumed so far in .nconsumed.'
+    def __init__(self, it):
+        self.it = it
+        self.nconsumed = 0
+
+    def __iter__(self):
+        for v in self.it:
+            self.nconsumed += 1
+            yield v
+
+
+def aggregator(name, func, *args, type=None, streaming=False):
+    'Define simple aggregator `name` that calls func(values); *streaming* funcs consume the values generator directly without materializing a list.'
+    np_func = _npAggrFuncs.get(name)
     def _func(col, rows):  # wrap builtins so they can have a .type
+        if np_func is not None:
+            arr = col.getNumpyValues(rows)
+            if arr is not None:   # fast path: one vectorized reduction over the whole column
+                if arr.dtype.kind == 'f':
+                    arr = arr[~np.isnan(arr)]
+                if len(arr) > 0:  # all-null columns keep the slow path semantics
+                    ret = swarAggregate(name, arr)
+                    if ret is not None:
+                        return ret
+                    return np_func(arr)
+
+        if streaming:
+            vals = _CountingIterator(col.getValues(rows))
+            try:
+                return func(vals, *args)
+            except Exception as e:
+                if vals.nconsumed == 0:
+                    return None
+                return e
+
         vals = list(col.getValues(rows))
         try:
             return func(vals, *args)
@@ -49,27 +244,62 @@ def aggregator(name, func, *args, type=None):
 ## specific aggregator implementations
 
 def mean(vals):
-    vals = list(vals)
-    if vals:
-        return float(sum(vals))/len(vals)
+    'Kahan-compensated single-pass running mean: one add and one count per value, O(1) memory.'
+    total = 0.0
+    comp = 0.0  # running compensation for lost low-order bits
+    n = 0
+    for v in vals:
+        y = v - comp
+        t = total + y
+        comp = (t - total) - y
+        total = t
+        n += 1
+    if n:
+        return total/n
 
 def median(values):
-    L = sorted(values)
-    return L[len(L)//2]
+    'Middle value (upper middle for even-sized input), selected in O(n) average instead of a full sort.'
+    vals = list(values)
+    if not vals:
+        return None
+    k = len(vals)//2
+    if np is not None:
+        try:
+            # contiguous float64 buffer lets np.partition release the GIL
+            a = np.ascontiguousarray(vals, dtype=np.float64)
+        except (TypeError, ValueError):  # non-float-coercible values sort generically below
+            pass
+        else:
+            if _median_nb is not None:
+                return float(_median_nb(np.ascontiguousarray(a)))
+            return float(np.partition(a, k)[k])
+    return statistics.median_high(vals)
 
 # http://code.activestate.com/recipes/511478-finding-the-percentile-of-the-values/
-def _percentile(N, percent, key=lambda x:x):
+def _percentile(N, percent, key=None):
     """
-    Find the percentile of a list of values.
+    Find the percentile of a sorted list or ndarray of values.
 
-    @parameter N - is a list of values. Note N MUST BE already sorted.
+    @parameter N - is a list/ndarray of values. Note N MUST BE already sorted.
     @parameter percent - a float value from 0.0 to 1.0.
     @parameter key - optional key function to compute value from each element of N.
 
     @return - the percentile of the values
     """
-    if not N:
+    if len(N) == 0:
         return None
+    if np is not None and isinstance(N, np.ndarray) and N.dtype.kind not in 'fi':
+        try:
+            # typed C-contiguous buffer: numpy sort/partition/indexing run without
+            # the GIL, so column-parallel aggregation actually uses multiple cores
+            N = np.ascontiguousarray(N, dtype=np.float64)
+        except (TypeError, ValueError):
+            pass    # object-dtype values take the generic Python path below
+    if key is None:
+        if _percentile_nb is not None and isinstance(N, np.ndarray) and N.dtype.kind in 'fi':
+            # ascontiguousarray guards against read-only/strided views (e.g. mmapped arrays)
+            return float(_percentile_nb(np.ascontiguousarray(N), percent))
+        key = lambda x: x
     k = (len(N)-1) * percent
     f = math.floor(k)
     c = math.ceil(k)
@@ -79,21 +309,102 @@ def _percentile(N, percent, key=lambda x:x):
     d1 = key(N[int(c)]) * (k-f)
     return d0+d1
 
-@functools.lru_cache(100)
+
+_percentileAggrs = {}  # [pct] -> aggregator; pcts come from a small closed set, so no cap needed
+
 def percentile(pct):
-    return _defaggr('p%s'%pct, None, lambda col,rows,pct=pct: _percentile(sorted(col.getValues(rows)), pct/100))
+    aggr = _percentileAggrs.get(pct)
+    if aggr is None:
+        aggr = _defaggr('p%s'%pct, None, lambda col,rows,pct=pct: _percentile(col._sortedValues(rows), pct/100))
+        _percentileAggrs[pct] = aggr
+    return aggr
+
+
+class MultiPercentileAggregator:
+    'Aggregator computing several percentiles from a single sort of the column values.'
+    def __init__(self, name, pcts):
+        self.__name__ = name
+        self.type = None
+        self.pcts = pcts
+        self._subaggrs = None
+        self._memocol = None    # (col, rows, nrows) of last computation; strong refs
+        self._memorows = None   #  so ids cannot be recycled out from under the memo
+        self._memolen = None
+        self._memovals = None
+        Extensible._cache_clearers.append(self._clearmemo)  # edits invalidate between commands
+
+    def _clearmemo(self):
+        self._memocol = self._memorows = self._memolen = self._memovals = None
+
+    def _percentiles(self, col, rows):
+        'Return list of percentile values for .pcts, computed at most once per (col, rows).'
+        if col is not self._memocol or rows is not self._memorows or len(rows) != self._memolen:
+            self._memovals = self._compute(col, rows)
+            self._memocol = col
+            self._memorows = rows
+            self._memolen = len(rows)
+        return self._memovals
+
+    def _compute(self, col, rows):
+        qs = [pct/100 for pct in self.pcts]
+
+        # when the requested ranks span at most half the column, np.partition
+        # on just those ranks (O(n)) beats the full sort of _sortedValues
+        if np is not None and max(qs) - min(qs) <= 0.5:
+            arr = col.getNumpyValues(rows)
+            if arr is not None:
+                a = arr[~np.isnan(arr)] if arr.dtype.kind == 'f' else arr
+                n = len(a)
+                if n == 0:
+                    return [None]*len(qs)
+                ks = sorted(set(k for q in qs for k in (math.floor((n-1)*q), math.ceil((n-1)*q))))
+                a = np.partition(a, ks)
+                out = []
+                for q in qs:
+                    k = (n-1) * q
+                    f = math.floor(k)
+                    c = math.ceil(k)
+                    if f == c:
+                        out.append(float(a[int(k)]))
+                    else:
+                        out.append(float(a[f]*(c-k) + a[c]*(k-f)))
+                return out
+
+        L = col._sortedValues(rows)
+        return [_percentile(L, q) for q in qs]
+
+    def __call__(self, col, rows):
+        return collections.OrderedDict(('p%s'%pct, v) for pct, v in zip(self.pcts, self._percentiles(col, rows)))
+
+    def subaggregators(self):
+        'Per-percentile aggregators for fan-out, all sharing a single sort.'
+        if self._subaggrs is None:
+            self._subaggrs = [_defaggr('p%s'%pct, None, lambda col,rows,i=i: self._percentiles(col, rows)[i])
+                                for i, pct in enumerate(self.pcts)]
+        return self._subaggrs
+
 
 def quantiles(q):
-    return [percentile(round(100*i/q)) for i in range(1, q)]
-
-aggregator('min', min)
-aggregator('max', max)
-aggregator('avg', mean, type=float)
-aggregator('mean', mean, type=float)
-aggregator('median', median)
-aggregator('sum', sum)
+    return MultiPercentileAggregator('q%d'%q, [round(100*i/q) for i in range(1, q)])
+
+aggregator('min', min, streaming=True)
+aggregator('max', max, streaming=True)
+aggregator('avg', mean, type=float, streaming=True)
+aggregator('mean', mean, type=float, streaming=True)
+
+# median shares the sorted-values cache with the percentile aggregators
+def _sortedMedian(col, rows):
+    try:
+        L = col._sortedValues(rows)
+    except Exception as e:  # unsortable values: return the error for display, like aggregator()
+        return e
+    return L[len(L)//2] if len(L) else None
+
+aggregators['median'] = _defaggr('median', None, _sortedMedian)
+
+aggregator('sum', sum, streaming=True)
 aggregator('distinct', set, type=vlen)
-aggregator('count', lambda values: sum(1 for v in values), type=int)
+aggregator('count', lambda values: sum(1 for v in values), type=int, streaming=True)
 aggregator('list', list)
 
 aggregators['q3'] = quantiles(3)
@@ -115,6 +426,8 @@ def addAggregators(cols, aggrnames):
     'add aggregator for each aggrname to each of cols'
     for aggrname in aggrnames:
         aggrs = aggregators.get(aggrname)
+        if hasattr(aggrs, 'subaggregators'):  # multi-output aggregators fan out to one aggregator per output
+            aggrs = aggrs.subaggregators()
         aggrs = aggrs if isinstance(aggrs, list) else [aggrs]
         for aggr in aggrs:
             for c in cols:
@@ -124,6 +437,96 @@ def addAggregators(cols, aggrnames):
                     c.aggregators += [aggr]
 
 
+_bundleCache = {}  # [frozenset of aggregator names] -> evaluation plan
+
+def _isPctName(name):
+    return name.startswith('p') and name[1:].isdigit()
+
+def compile_bundle(aggs):
+    'Return callable(col, rows) -> {agg: value} specialized for this fixed aggregator set: one sorted array serves every order statistic in the set, and sum/count/mean are read from it rather than re-scanning the column.'
+    key = frozenset(agg.__name__ for agg in aggs)
+    plan = _bundleCache.get(key)
+    if plan is None:
+        fusable = frozenset(n for n in key
+                            if n in ('median', 'min', 'max', 'sum', 'count', 'mean', 'avg') or _isPctName(n))
+        plan = functools.partial(_runBundle, fusable)
+        _bundleCache[key] = plan
+    return lambda col, rows: plan(col, rows, aggs)
+
+def _runBundle(fusable, col, rows, aggs):
+    byname = {}
+    if fusable:
+        try:
+            L = col._sortedValues(rows)
+        except Exception:
+            # unsortable values (e.g. mixed anytype): skip fusion and let each
+            # aggregator run standalone below, reporting its own error
+            pass
+        else:
+            n = len(L)
+            total = None
+            for name in fusable:
+                try:
+                    if name in ('sum', 'mean', 'avg') and total is None:
+                        if np is not None and isinstance(L, np.ndarray):
+                            total = float(L.sum(dtype=np.float64))  # float64 accumulator, like the main numpy path
+                        else:
+                            total = sum(L)
+                    if name == 'count':
+                        byname[name] = n
+                    elif name == 'sum':
+                        byname[name] = total
+                    elif n == 0:
+                        byname[name] = None
+                    elif name in ('mean', 'avg'):
+                        byname[name] = total/n
+                    elif name == 'median':
+                        byname[name] = L[n//2]
+                    elif name == 'min':
+                        byname[name] = L[0]
+                    elif name == 'max':
+                        byname[name] = L[-1]
+                    else:
+                        byname[name] = _percentile(L, int(name[1:])/100)
+                except Exception as e:  # e.g. sum over mixed types; only this aggregator shows the error
+                    byname[name] = e
+
+    results = {}
+    for agg in aggs:
+        if agg.__name__ in byname:
+            results[agg] = byname[agg.__name__]
+        else:
+            try:
+                results[agg] = agg(col, rows)
+            except Exception as e:
+                results[agg] = e
+    return results
+
+
+_aggrExecutor = None
+
+def _aggregatorExecutor():
+    'Shared thread pool for batch aggregator evaluation; numpy sort/partition release the GIL, so columns aggregate in parallel across cores.'
+    global _aggrExecutor
+    if _aggrExecutor is None:
+        _aggrExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+    return _aggrExecutor
+
+
+def run_aggregates(cols_aggs, rows):
+    'Evaluate aggregators for [(col, [aggr, ...]), ...] over `rows`, one pool job per column so each column sorts at most once; return {(col, aggr): value}.  Cross-column parallelism needs multiple (col, aggs) pairs; a single pair runs as one pool job.'
+    def _runcol(col, aggs):
+        return [(agg, agg(col, rows)) for agg in aggs]
+
+    pool = _aggregatorExecutor()
+    futures = {pool.submit(_runcol, col, aggs): col for col, aggs in cols_aggs}
+    results = {}
+    for fut, col in futures.items():
+        for agg, val in fut.result():
+            results[(col, agg)] = val
+    return results
+
+
 @Column.api
 def aggname(col, agg):
     'Consistent formatting of the name of given aggregator for this column.  e.g. "col1_sum"'
@@ -138,10 +541,29 @@ def show_aggregate(col, agg, rows):
     dispval = col.format(typedval)
     vd.status(dispval)
 
+@Column.api
+@asyncthread
+def show_aggregates(col, aggs, rows):
+    'Show several aggregated values in status; multi-aggregator selections run as one compiled bundle sharing sort/sum work.'
+    expanded = []
+    for agg in aggs:
+        if hasattr(agg, 'subaggregators'):  # q4 etc fan out per percentile, as in addAggregators
+            expanded.extend(agg.subaggregators())
+        else:
+            expanded.append(agg)
+    aggs = expanded
+    if len(aggs) >= 2:
+        results = compile_bundle(aggs)(col, rows)
+    else:
+        results = {agg: val for (c, agg), val in run_aggregates([(col, aggs)], rows).items()}
+    for agg, aggval in results.items():
+        typedval = wrapply(agg.type or col.type, aggval)
+        vd.status('%s=%s' % (col.aggname(agg), col.format(typedval)))
+
 
 addGlobals(globals())
 
 
 Sheet.addCommand('+', 'aggregate-col', 'addAggregators([cursorCol], chooseMany(aggregators.keys()))', 'add aggregator to current column')
-Sheet.addCommand('z+', 'show-aggregate', 'for agg in chooseMany(aggregators): cursorCol.show_aggregate(agg,  selectedRows or rows)', 'display result of aggregator over values in selected rows for current column')
+Sheet.addCommand('z+', 'show-aggregate', 'cursorCol.show_aggregates(chooseMany(aggregators), selectedRows or rows)', 'display result of aggregator over values in selected rows for current column')
 ColumnsSheet.addCommand('g+', 'aggregate-cols', 'addAggregators(selectedRows or source[0].nonKeyVisibleCols, chooseMany(aggregators.keys()))', 'add aggregators to selected source columns')
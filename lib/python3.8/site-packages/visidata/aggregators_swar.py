@@ -0,0 +1,81 @@
+'SWAR (SIMD-within-a-register) aggregation kernels for narrow-integer columns.'
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+__all__ = ['swarAggregate']
+
+
+if np is not None and njit is not None:
+    @njit(cache=True)
+    def _sum_u16x4(packed):
+        'Sum uint16 lanes packed 4-per-uint64: two lane-parallel adds per word, with periodic flushes before the 32-bit lane accumulators can carry.'
+        mask = np.uint64(0x0000ffff0000ffff)
+        sh16 = np.uint64(16)
+        sh32 = np.uint64(32)
+        lo32 = np.uint64(0xffffffff)
+        acc_even = np.uint64(0)   # lanes 0 and 2, in 32-bit slots
+        acc_odd = np.uint64(0)    # lanes 1 and 3
+        total = 0
+        pending = 0
+        for x in packed:
+            acc_even += x & mask
+            acc_odd += (x >> sh16) & mask
+            pending += 1
+            if pending == 65535:  # max adds before a 32-bit slot could overflow
+                total += int(acc_even & lo32) + int(acc_even >> sh32)
+                total += int(acc_odd & lo32) + int(acc_odd >> sh32)
+                acc_even = np.uint64(0)
+                acc_odd = np.uint64(0)
+                pending = 0
+        total += int(acc_even & lo32) + int(acc_even >> sh32)
+        total += int(acc_odd & lo32) + int(acc_odd >> sh32)
+        return total
+
+    @njit(cache=True)
+    def _min_u16x4(packed):
+        'Min of uint16 lanes packed 4-per-uint64: one load per 4 values, branchless lane selection.'
+        m = np.uint64(0xffff)
+        best = np.int64(0xffff)
+        for x in packed:
+            for sh in (np.uint64(0), np.uint64(16), np.uint64(32), np.uint64(48)):
+                v = np.int64((x >> sh) & m)
+                best = v ^ ((v ^ best) & -np.int64(best < v))  # branchless: best stays unless v < best
+        return best
+
+    @njit(cache=True)
+    def _max_u16x4(packed):
+        'Max of uint16 lanes packed 4-per-uint64.'
+        m = np.uint64(0xffff)
+        best = np.int64(0)
+        for x in packed:
+            for sh in (np.uint64(0), np.uint64(16), np.uint64(32), np.uint64(48)):
+                v = np.int64((x >> sh) & m)
+                best = v ^ ((v ^ best) & -np.int64(v < best))  # branchless: best stays unless v > best
+        return best
+
+    _swarKernels = {
+        'sum': _sum_u16x4,
+        'min': _min_u16x4,
+        'max': _max_u16x4,
+    }
+else:
+    _swarKernels = {}
+
+
+def swarAggregate(aggname, arr):
+    'Reduce ndarray `arr` with a SWAR kernel when eligible (uint16 values, length a multiple of 4, numba available); return None otherwise.'
+    kernel = _swarKernels.get(aggname)
+    if kernel is None:
+        return None
+    if arr.dtype != np.uint16 or arr.size == 0 or arr.size % 4 != 0:
+        return None
+    packed = np.ascontiguousarray(arr).view(np.uint64)
+    return int(kernel(packed))
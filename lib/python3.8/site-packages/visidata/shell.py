@@ -2,15 +2,25 @@ import os
 import stat
 import subprocess
 import contextlib
+import functools
+import queue
+import threading
 try:
     import pwd
     import grp
 except ImportError:
     pass # pwd,grp modules not available on Windows
 
+try:
+    import magic  # python-magic: in-process libmagic instead of file(1) subprocesses
+    if not hasattr(magic, 'Magic'):
+        magic = None  # some other module named `magic` (e.g. file-magic) is installed
+except ImportError:
+    magic = None
+
 from visidata import Column, Sheet, LazyComputeRow, asynccache, options, option, globalCommand
 from visidata import Path, ENTER, date, asyncthread, confirm, fail, FileExistsError, VisiData
-from visidata import CellColorizer, RowColorizer, modtime, filesize
+from visidata import CellColorizer, RowColorizer
 
 
 option('dir_recurse', False, 'walk source path recursively on DirSheet')
@@ -47,29 +57,139 @@ def addShellColumns(cmd, sheet):
         sheet.addColumn(c, index=sheet.cursorColIndex+i+1)
 
 
+class _ShellWorker:
+    '''A persistent bash process executing NUL-terminated argv requests from stdin,
+    replying with NUL-terminated stdout and stderr fields.
+
+    The command runs with stdin redirected from /dev/null so stdin-reading
+    commands (wc, grep, head) terminate instead of blocking on the request
+    pipe.  Note bash command substitution drops NUL bytes, so commands with
+    binary output are mangled relative to a raw Popen.communicate().'''
+    _script = '''t=$(mktemp); trap 'rm -f "$t"' EXIT
+while IFS= read -r -d "" n; do
+  a=()
+  for ((i=0; i<n; i++)); do IFS= read -r -d "" x; a+=("$x"); done
+  o=$("${a[@]}" </dev/null 2>"$t")
+  printf "%s\\0" "$o"
+  printf "%s\\0" "$(cat "$t")"
+done'''
+
+    def __init__(self):
+        self.p = subprocess.Popen(['bash', '-c', self._script], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def run(self, args):
+        'Execute args in the worker; return (stdout, stderr) bytes (trailing newlines stripped by the shell).'
+        req = ('%d\0' % len(args)).encode('utf-8') + b''.join(str(a).encode('utf-8')+b'\0' for a in args)
+        self.p.stdin.write(req)
+        self.p.stdin.flush()
+        buf = b''
+        while buf.count(b'\0') < 2:
+            chunk = os.read(self.p.stdout.fileno(), 65536)
+            if not chunk:
+                raise OSError('shell worker exited')
+            buf += chunk
+        out, err = buf.split(b'\0')[:2]
+        return out, err
+
+    def kill(self):
+        with contextlib.suppress(Exception):
+            self.p.kill()
+
+
+class _ShellPool:
+    'Fixed-size pool of persistent shell workers; amortizes the per-row fork/exec of a large interpreter process across all rows.'
+    def __init__(self, nworkers=None):
+        self.nworkers = nworkers or os.cpu_count() or 1
+        self.idle = queue.Queue()
+        self.nspawned = 0
+        self.lock = threading.Lock()
+
+    def _checkout(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            if self.nspawned < self.nworkers:
+                self.nspawned += 1
+                return _ShellWorker()
+        return self.idle.get()  # block until a worker frees up
+
+    def run(self, args):
+        if any('\0' in str(a) for a in args):
+            # a NUL inside an argument would split the worker's NUL-delimited
+            # request frame and desynchronize the protocol for all later rows;
+            # refuse before checkout so the caller's one-off Popen path runs
+            raise ValueError('NUL byte in shell argument')
+        w = self._checkout()
+        try:
+            ret = w.run(args)
+        except Exception:
+            w.kill()
+            with self.lock:
+                self.nspawned -= 1
+            raise
+        self.idle.put(w)
+        return ret
+
+
+_shellPool = None
+
+def _sharedShellPool():
+    global _shellPool
+    if _shellPool is None:
+        _shellPool = _ShellPool()
+    return _shellPool
+
+
 class ColumnShell(Column):
     def __init__(self, name, cmd=None, **kwargs):
+        import shlex
         super().__init__(name, **kwargs)
         self.expr = cmd or name
+        # the command template is fixed at construction, so parse it once here
+        # instead of re-running shlex per row; (literal, colname or None) per token
+        self._tokens = [(tok, tok[1:] if tok.startswith('$') else None) for tok in shlex.split(self.expr)]
 
     @asynccache(lambda col,row: (col, col.sheet.rowid(row)))
     def calcValue(self, row):
         try:
-            import shlex
-            args = []
             context = LazyComputeRow(self.source, row)
-            for arg in shlex.split(self.expr):
-                if arg.startswith('$'):
-                    args.append(str(context[arg[1:]]))
-                else:
-                    args.append(arg)
-
-            p = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            return p.communicate()
+            args = [str(context[colname]) if colname else lit for lit, colname in self._tokens]
+
+            try:
+                return _sharedShellPool().run(args)
+            except Exception:  # worker protocol failure; run this row standalone
+                p = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                return p.communicate()
         except Exception as e:
             vd.exceptionCaught(e)
 
 
+@functools.lru_cache(256)
+def _uidName(uid):
+    'Memoized user name for uid; directories repeat a handful of uids, and NSS lookups can be slow (e.g. LDAP).'
+    return pwd.getpwuid(uid).pw_name
+
+@functools.lru_cache(256)
+def _gidName(gid):
+    'Memoized group name for gid.'
+    return grp.getgrgid(gid).gr_name
+
+
+def _rowStat(row):
+    'Return the stat_result captured at load time, or fall back to a live stat().'
+    return getattr(row, '_cached_stat', None) or row.stat()
+
+def _rowFilesize(row):
+    st = _rowStat(row)
+    return st and st.st_size
+
+def _rowModtime(row):
+    st = _rowStat(row)
+    return st and st.st_mtime
+
+
 class DirSheet(Sheet):
     'Sheet displaying directory, using ENTER to open a particular file.  Edited fields are applied to the filesystem.'
     rowtype = 'files' # rowdef: Path
@@ -78,46 +198,57 @@ class DirSheet(Sheet):
         Column('filename', getter=lambda col,row: row.name + row.suffix),
         Column('abspath', width=0, type=str),
         Column('ext', getter=lambda col,row: row.is_dir() and '/' or row.ext),
-        Column('size', type=int, getter=lambda col,row: filesize(row)),
-        Column('modtime', type=date, getter=lambda col,row: modtime(row)),
-        Column('owner', width=0, getter=lambda col,row: pwd.getpwuid(row.stat().st_uid).pw_name),
-        Column('group', width=0, getter=lambda col,row: grp.getgrgid(row.stat().st_gid).gr_name),
-        Column('mode', width=0, getter=lambda col,row: '{:o}'.format(row.stat().st_mode)),
-        Column('filetype', width=0, cache=True, getter=lambda col,row: subprocess.Popen(['file', '--brief', row], stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()[0].strip()),
+        Column('size', type=int, getter=lambda col,row: _rowFilesize(row)),
+        Column('modtime', type=date, getter=lambda col,row: _rowModtime(row)),
+        Column('owner', width=0, getter=lambda col,row: _uidName(_rowStat(row).st_uid)),
+        Column('group', width=0, getter=lambda col,row: _gidName(_rowStat(row).st_gid)),
+        Column('mode', width=0, getter=lambda col,row: '{:o}'.format(_rowStat(row).st_mode)),
+        Column('filetype', width=0, cache=True, getter=lambda col,row: col.sheet.filetype(row)),
     ]
     nKeys = 2
     _ordering = [('modtime', True)]  # sort by reverse modtime initially
 
-    def iterload(self):
-        def _walkfiles(p):
-            basepath = str(p)
-            for folder, subdirs, files in os.walk(basepath):
-                subfolder = folder[len(basepath)+1:]
-                if subfolder in ['.', '..']: continue
-
-                fpath = Path(folder)
-                yield fpath
+    _filetypeBatchSize = 100  # max paths per `file` subprocess
 
-                for fn in files:
-                    yield fpath/fn
+    def filetype(self, row):
+        'File type of `row`, via in-process libmagic when python-magic is installed; otherwise batches of up to _filetypeBatchSize paths per `file --brief` subprocess.'
+        if magic is not None:
+            if not hasattr(self, '_magic'):
+                try:
+                    self._magic = magic.Magic()
+                except Exception:
+                    self._magic = None  # libmagic database unavailable; use the subprocess path
+            if self._magic is not None:
+                return self._magic.from_file(str(row))
 
-        def _listfiles(p):
-            basepath = str(p)
-            for fn in os.listdir(basepath):
-                yield p/fn
+        key = str(row)
+        if key not in self._filetypes:
+            batch = [row] + [r for r in self.rows if r is not row and str(r) not in self._filetypes][:self._filetypeBatchSize-1]
+            out, _ = subprocess.Popen(['file', '--brief'] + [str(r) for r in batch], stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()
+            for r, line in zip(batch, out.splitlines()):
+                self._filetypes[str(r)] = line.strip()
+        return self._filetypes.get(key)
 
+    def iterload(self):
+        hidden_files = options.dir_hidden
 
-        basepath = str(self.source)
+        def _scanwalk(basepath, parent, recurse):
+            'Walk with os.scandir, keeping each DirEntry stat on the yielded Path instead of discarding it like os.walk does.'
+            with os.scandir(basepath) as entries:
+                for e in entries:
+                    if e.name.startswith('.') and not hidden_files:
+                        continue
+                    fp = parent/e.name
+                    with contextlib.suppress(OSError):
+                        fp._cached_stat = e.stat()  # reuse the scandir stat instead of a second syscall per column
+                    yield fp
+                    if recurse and e.is_dir(follow_symlinks=False):
+                        yield from _scanwalk(e.path, fp, True)
 
-        folders = set()
-        f = _walkfiles if options.dir_recurse else _listfiles
+        yield from _scanwalk(str(self.source), self.source, options.dir_recurse)
 
-        hidden_files = options.dir_hidden
-        for p in f(self.source):
-            if hidden_files and p.name.startswith('.'):
-                continue
 
-            yield p
+DirSheet.init('_filetypes', dict)  # [str(path)] -> output of `file --brief`
 
 
 class FileListSheet(DirSheet):
@@ -10,7 +10,10 @@ __all__ = ['isNullFunc', 'forward', 'wrmap', 'wrapply', 'TypedWrapper', 'TypedEx
 option('null_value', None, 'a value to be counted as null', replay=True)
 
 def isNullFunc():
-    return lambda v,nulls=set([None, options.null_value]): v in nulls or isinstance(v, TypedWrapper)
+    nulls = set([None, options.null_value])
+    fn = lambda v: v in nulls or isinstance(v, TypedWrapper)
+    fn.nulls = nulls  # exposed so per-row hot loops can inline the test without a call per value
+    return fn
 
 
 @functools.total_ordering